@@ -12,60 +12,661 @@ Descripción:
     No se eliminan los archivos originales.
 """
 
-import os, hashlib, shutil, imagehash
-from PIL import Image, ExifTags
+import os, errno, fcntl, hashlib, shutil
+import numpy as np
+import logging, mmap, multiprocessing, queue, sqlite3, struct, threading
+from collections import deque
+from itertools import chain, islice
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from PIL import Image
 from datetime import datetime
 
+try:
+    import pyvips  # Opcional: decodifica miniaturas con libjpeg-turbo (shrink-on-load)
+except (ImportError, OSError):
+    pyvips = None  # Sin libvips se usa PIL para el pHash
+
+try:
+    import exifread  # Opcional: lee solo la cabecera EXIF, sin abrir la imagen con PIL
+    logging.getLogger("exifread").setLevel(logging.ERROR)  # Silenciar avisos por archivo
+except ImportError:
+    exifread = None  # Sin exifread se leen los metadatos con PIL
+
+try:
+    from numba import njit  # Opcional: compila el kernel DCT del pHash
+except ImportError:
+    njit = None
+
 # Extensiones válidas de imagen a procesar
 EXT = (".jpg",".jpeg",".png",".bmp",".tiff",".gif",".heic")
+EXT_SET = frozenset(EXT)  # Búsqueda O(1) de la extensión
+
+# Identificador del tag EXIF 'DateTimeOriginal' (formato 'YYYY:MM:DD HH:MM:SS')
+DATETIME_ORIGINAL = 36867
+
+# Extensiones JPEG, cuyo EXIF se lee con el analizador propio
+JPEG_EXT = (".jpg", ".jpeg")
+
+# Bytes iniciales de un JPEG donde se busca el segmento EXIF (como máximo ocupa 64 KiB)
+EXIF_SCAN = 128 * 1024
+
+# Tamaño de bloque para lectura de archivos (1 MiB)
+CHUNK = 1 << 20
+
+# Bytes leídos al inicio y al final de cada archivo para el hash rápido (64 KiB)
+QUICK = 64 * 1024
+
+# Tamaño mínimo para hashear un archivo proyectándolo en memoria con mmap (64 KiB)
+MMAP_MIN = 64 * 1024
+
+# Archivos a partir de este tamaño se hashean con lecturas concurrentes (8 MiB)
+PREAD_MIN = 8 << 20
+
+# Lecturas de 1 MiB en curso por archivo y hilos lectores que las atienden
+READ_DEPTH = 32
+READ_WORKERS = 16
+_readers = None
+
+# Hilos dedicados a copiar archivos (la copia libera el GIL durante la E/S)
+COPY_WORKERS = 4
+
+# Método de inicio de los procesos que calculan características: los hilos
+# copiadores ya están en marcha, y hacer fork (el valor por defecto en Linux)
+# de un proceso con hilos puede bloquearse
+POOL_START = "forkserver"
+
+# Copias pendientes como máximo entre la clasificación y los hilos copiadores
+COPY_QUEUE = 64
+
+# ioctl de Linux para clonar un archivo completo (reflink en btrfs/XFS)
+FICLONE = 0x40049409
+
+# Caché de características en la carpeta destino y filas entre cada commit
+CACHE_FILE = ".organizer_cache.sqlite"
+CACHE_COMMIT = 1000
+
+# Decodificador de las miniaturas y kernel DCT del pHash; se guarda en cada fila
+# de la caché para recalcular el pHash si cambian entre ejecuciones (p. ej. al
+# instalar pyvips o Numba)
+DECODER = ("vips" if pyvips is not None else "pil") + ("+numba" if njit else "+numpy")
+
+# Tamaño del búfer del archivo de log (1 MiB)
+LOG_BUFFER = 1 << 20
+
+# Imágenes por lote: cada proceso calcula el pHash de un lote completo a la vez
+PHASH_BATCH = 128
+
+# Lotes enviados como máximo a la vez a los procesos de características
+POOL_WINDOW = 2 * (os.cpu_count() or 1)
+
+# Distancia de Hamming máxima (exclusiva) entre pHash para considerar dos imágenes similares
+TOLERANCE = 10
+
+def _read_pool():
+    """
+    Devuelve el grupo de hilos lectores usado por pread_hash (se crea al primer uso).
+    """
+    global _readers
+    if _readers is None:
+        _readers = ThreadPoolExecutor(max_workers=READ_WORKERS)
+    return _readers
+
+def pread_hash(fd, size):
+    """
+    Calcula el SHA-256 de un archivo grande manteniendo hasta READ_DEPTH lecturas
+    de 1 MiB en curso a la vez (os.pread en hilos), de modo que el disco recibe
+    varias peticiones simultáneas mientras los bloques ya leídos se hashean en orden.
+    """
+    pool, h, window = _read_pool(), hashlib.sha256(), deque()
+    offsets = iter(range(0, size, CHUNK))
+    for off in islice(offsets, READ_DEPTH):
+        window.append(pool.submit(os.pread, fd, CHUNK, off))
+    try:
+        while window:
+            h.update(window.popleft().result())
+            off = next(offsets, None)
+            if off is not None:
+                window.append(pool.submit(os.pread, fd, CHUNK, off))
+    finally:
+        # Si una lectura falla, ninguna otra puede seguir usando el descriptor
+        # después de que quien llama lo cierre
+        for f in window:
+            f.cancel()
+        wait(window)
+    return h.hexdigest()
 
-def md5_hash(path):
+def file_hash(path):
     """
-    Calcula el hash MD5 de un archivo.
+    Calcula el hash SHA-256 de un archivo.
     Este hash permite identificar duplicados exactos comparando su contenido binario.
+    Los archivos pequeños se leen directamente; los medianos se proyectan en memoria
+    con mmap y se hashean de una sola vez, sin copiar los datos a búferes de Python;
+    los muy grandes se leen con varias lecturas concurrentes (pread_hash).
+    Si mmap no es posible, usa hashlib.file_digest (Python 3.11+) o lee bloques de 1 MiB.
     """
-    h = hashlib.md5()
-    with open(path,'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b""):  # Lee el archivo por bloques
+    with open(path, 'rb', buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_MIN:
+            return hashlib.sha256(f.read()).hexdigest()
+        if size >= PREAD_MIN:
+            return pread_hash(f.fileno(), size)
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return hashlib.sha256(mm).hexdigest()
+        except (OSError, ValueError):
+            pass  # Archivo que no se puede proyectar en memoria: leer por bloques
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
+        for chunk in iter(lambda: f.read(CHUNK), b""):  # Lee el archivo por bloques
             h.update(chunk)
     return h.hexdigest()
 
-def phash(path):
+def quick_hash(path, size):
     """
-    Calcula el perceptual hash (pHash) de una imagen.
-    Este hash permite detectar imágenes visualmente similares aunque no sean idénticas.
-    Devuelve None si ocurre un error al procesar la imagen.
+    Calcula un hash rápido leyendo solo los primeros y últimos 64 KiB del archivo.
+    Se usa como prefiltro: si no coincide, los archivos no pueden ser idénticos
+    y se evita leerlos completos.
     """
+    fd = os.open(path, os.O_RDONLY)
     try:
-        with Image.open(path) as img:
-            return str(imagehash.phash(img))
-    except:
-        return None
+        h = hashlib.sha256(os.pread(fd, QUICK, 0))
+        if size > QUICK:
+            h.update(os.pread(fd, QUICK, max(QUICK, size - QUICK)))
+    finally:
+        os.close(fd)
+    return h.hexdigest()
+
+def same_content(entry, other):
+    """
+    Compara dos imágenes del mismo tamaño: primero por el hash rápido y, si
+    coincide, por el hash completo. Los hashes calculados quedan guardados en cada entrada.
+    """
+    for e in (entry, other):
+        if e["quick"] is None:
+            e["quick"] = quick_hash(e["path"], e["size"])
+    if entry["quick"] != other["quick"]:
+        return False
+    if entry["size"] <= 2 * QUICK:
+        return True  # El hash rápido ya cubrió el archivo completo
+    for e in (entry, other):
+        if e["full"] is None:
+            e["full"] = file_hash(e["path"])
+    return entry["full"] == other["full"]
+
+def is_exact_duplicate(entry, sizes, store):
+    """
+    Indica si la imagen de 'entry' es idéntica a alguna imagen única ya registrada.
+    'sizes' agrupa las imágenes únicas por tamaño; solo se calculan hashes si hay
+    otra imagen del mismo tamaño. Si se calcula un hash de una imagen ya
+    registrada, se vuelve a guardar con 'store' para no perderlo en la caché.
+    """
+    for other in sizes.get(entry["size"], ()):
+        known = other["quick"], other["full"]
+        same = same_content(entry, other)
+        if (other["quick"], other["full"]) != known:
+            store(other)
+        if same:
+            return True
+    return False
+
+# Conteo de bits a 1 por elemento (np.bitwise_count existe desde NumPy 2.0)
+if hasattr(np, "bitwise_count"):
+    popcount = np.bitwise_count
+else:
+    _POP8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    def popcount(arr):
+        return _POP8[arr.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+class PHashIndex:
+    """
+    Conjunto de pHash de 64 bits guardados en un arreglo NumPy contiguo (uint64).
+    La búsqueda de similares calcula la distancia de Hamming contra todos los
+    hashes en una sola operación vectorizada (XOR + conteo de bits), en lugar
+    de recorrerlos uno a uno en Python.
+    """
+    def __init__(self, block=4096):
+        self.block = block  # El arreglo crece en bloques de este tamaño
+        self.hashes = np.empty(block, dtype=np.uint64)
+        self.count = 0
+
+    def add(self, h):
+        """
+        Agrega un pHash al índice.
+        """
+        if self.count == len(self.hashes):
+            self.hashes = np.concatenate((self.hashes, np.empty(self.block, dtype=np.uint64)))
+        self.hashes[self.count] = h
+        self.count += 1
+
+    def has_similar(self, h, tolerance):
+        """
+        Indica si algún pHash guardado está a una distancia menor que 'tolerance' de 'h'.
+        """
+        if not self.count:
+            return False
+        dists = popcount(self.hashes[:self.count] ^ np.uint64(h))
+        return bool((dists < tolerance).any())
+
+# Matriz de cosenos de la DCT-II: 8 frecuencias más bajas x 32 muestras (constante)
+DCT_COS = np.cos(np.pi * np.arange(8)[:, None] * (2 * np.arange(32) + 1) / 64)
+
+# Los coeficientes se redondean a 6 decimales antes de la mediana: en imágenes
+# planas o por bloques los que valen 0 salen como ±1e-13 por el redondeo de la
+# multiplicación y cada kernel los ordenaría de forma distinta a scipy (imagehash)
+DCT_ROUND = 1e6
 
-def get_year(path):
+def _dct_phash_loops(stack):
     """
-    Obtiene el año de creación de una imagen.
-    Prioriza el metadato EXIF 'DateTimeOriginal'.
-    Si no existe, usa la fecha de modificación del archivo.
+    Kernel del pHash en bucles explícitos (pensado para compilarse con Numba).
+    Para cada miniatura de 32x32 del lote: DCT 2D restringida al bloque 8x8 de
+    frecuencias bajas, redondeo (DCT_ROUND), mediana y empaquetado de los 64 bits en un uint64.
+    """
+    out = np.empty(stack.shape[0], dtype=np.uint64)
+    tmp = np.empty((8, 32))
+    low = np.empty(64)
+    for i in range(stack.shape[0]):
+        pixels = stack[i]
+        tmp[:] = 0.0
+        for u in range(8):
+            for x in range(32):
+                c = DCT_COS[u, x]
+                for y in range(32):
+                    tmp[u, y] += c * pixels[x, y]
+        for u in range(8):
+            for v in range(8):
+                s = 0.0
+                for y in range(32):
+                    s += tmp[u, y] * DCT_COS[v, y]
+                low[u * 8 + v] = np.rint(s * DCT_ROUND) / DCT_ROUND
+        med = np.median(low)
+        h = np.uint64(0)
+        for k in range(64):
+            h = (h << np.uint64(1)) | np.uint64(low[k] > med)
+        out[i] = h
+    return out
+
+def _dct_phash_numpy(stack):
+    """
+    Kernel del pHash vectorizado con NumPy (equivalente a _dct_phash_loops):
+    una sola multiplicación matricial por lote para la DCT de todas las miniaturas.
+    """
+    low = (DCT_COS @ stack.astype(np.float64) @ DCT_COS.T).reshape(len(stack), 64)
+    low = np.rint(low * DCT_ROUND) / DCT_ROUND
+    bits = low > np.median(low, axis=1, keepdims=True)
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+# Con Numba se compila el kernel en bucles; sin Numba se usa la versión NumPy.
+# Ambos reciben un lote uint8[N, 32, 32] y devuelven uint64[N] (misma receta que imagehash.phash).
+dct_phash_batch = njit(cache=True)(_dct_phash_loops) if njit else _dct_phash_numpy
+
+def vips_thumbnail(path):
+    """
+    Decodifica con libvips una miniatura de 32x32 en escala de grises equivalente
+    a la de pil_thumbnail, para que el pHash no dependa del decodificador usado:
+    reduce al cargar (shrink-on-load) a 64x64 sin aplicar la orientación EXIF
+    (PIL tampoco la aplica), convierte a luminancia con los pesos de PIL ("L")
+    y termina la reducción con Lanczos.
+    """
+    img = pyvips.Image.thumbnail(path, 64, height=64, size="force", no_rotate=True)
+    if img.interpretation not in ("srgb", "b-w"):
+        img = img.colourspace("srgb")
+    if img.bands >= 3:
+        img = img[0:3].recomb([[0.299, 0.587, 0.114]])  # Mismos pesos que PIL
+    else:
+        img = img[0]  # Ya en escala de grises (se descarta el alfa, como PIL)
+    img = img.resize(32 / img.width, vscale=32 / img.height, kernel="lanczos3")
+    img = (img + 0.5).cast("uchar")  # Redondeo en lugar de truncado
+    return np.ndarray(buffer=img.write_to_memory(), dtype=np.uint8, shape=(32, 32))
+
+def pil_thumbnail(img):
+    """
+    Reduce una imagen ya abierta con PIL a una miniatura de 32x32 en escala de
+    grises, igual que imagehash.phash (Lanczos).
+    """
+    return np.asarray(img.convert("L").resize((32, 32), Image.LANCZOS), dtype=np.uint8)
+
+def _ifd_find(tiff, order, offset, tag):
+    """
+    Busca un tag en el IFD que empieza en 'offset' dentro del bloque TIFF del EXIF.
+    Devuelve (tipo, cantidad, campo de valor de 4 bytes) o None si no está.
+    """
+    count = struct.unpack_from(order + "H", tiff, offset)[0]
+    for i in range(count):
+        entry = offset + 2 + 12 * i  # Cada entrada ocupa 12 bytes
+        t, typ, n = struct.unpack_from(order + "HHI", tiff, entry)
+        if t == tag:
+            return typ, n, tiff[entry + 8:entry + 12]
+    return None
+
+def jpeg_exif_year(path):
+    """
+    Obtiene el año de 'DateTimeOriginal' de un JPEG analizando directamente su
+    segmento EXIF (APP1), sin librerías de imagen: recorre los segmentos del
+    encabezado, busca en IFD0 el puntero al IFD EXIF (tag 0x8769) y en este el
+    tag 0x9003, del que lee solo los 4 bytes del año.
+    Devuelve None si el archivo no tiene ese metadato o su estructura es inesperada.
     """
     try:
-        with Image.open(path) as img:
-            exif = img._getexif()
-            if exif:
-                for tag, val in exif.items():
-                    if ExifTags.TAGS.get(tag) == 'DateTimeOriginal':
-                        return val.split(":")[0]  # Extrae el año del formato 'YYYY:MM:DD'
-    except:
+        with open(path, 'rb') as f:
+            data = f.read(EXIF_SCAN)
+        if data[:2] != b"\xff\xd8":
+            return None  # No es un JPEG
+        pos = 2
+        while pos + 4 <= len(data) and data[pos] == 0xFF:
+            marker = data[pos + 1]
+            if marker in (0xDA, 0xD9):
+                return None  # Inicio de los datos de imagen: no hay EXIF
+            length = int.from_bytes(data[pos + 2:pos + 4], "big")
+            if marker == 0xE1 and data[pos + 4:pos + 10] == b"Exif\x00\x00":
+                tiff = data[pos + 10:pos + 2 + length]
+                order = {b"II": "<", b"MM": ">"}[tiff[:2]]
+                ifd0 = struct.unpack_from(order + "I", tiff, 4)[0]
+                ptr = _ifd_find(tiff, order, ifd0, 0x8769)
+                if ptr is None:
+                    return None
+                dto = _ifd_find(tiff, order, struct.unpack(order + "I", ptr[2])[0], 0x9003)
+                if dto is None or dto[0] != 2 or dto[1] < 5:  # Debe ser texto ASCII
+                    return None
+                at = struct.unpack(order + "I", dto[2])[0]
+                year = tiff[at:at + 4]
+                return year.decode("ascii") if len(year) == 4 and year.isdigit() else None
+            pos += 2 + length
+    except (OSError, KeyError, struct.error):
         pass
+    return None
+
+def exifread_year(path):
+    """
+    Obtiene el año del metadato EXIF 'DateTimeOriginal' usando exifread, que lee
+    solo la cabecera EXIF y se detiene al encontrar ese tag.
+    Devuelve None si la imagen no tiene ese metadato o no contiene un año válido.
+    """
+    with open(path, 'rb') as f:
+        tags = exifread.process_file(f, stop_tag='DateTimeOriginal', details=False)
+    val = tags.get('EXIF DateTimeOriginal')
+    year = str(val)[:4] if val else ""  # Extrae el año del formato 'YYYY:MM:DD'
+    # Una fecha en blanco o no ASCII (p. ej. "[49, 57, ...]") no es un año válido
+    return year if len(year) == 4 and year.isascii() and year.isdigit() else None
+
+def year_from_exif(img):
+    """
+    Obtiene el año del metadato EXIF 'DateTimeOriginal' de una imagen ya abierta.
+    Devuelve None si la imagen no tiene ese metadato o no contiene un año válido.
+    """
+    exif = img._getexif()
+    val = exif.get(DATETIME_ORIGINAL) if exif else None
+    # PIL devuelve bytes si el tag no es ASCII: solo se acepta un texto con un año de 4 cifras
+    year = val[:4] if isinstance(val, str) else ""  # Extrae el año del formato 'YYYY:MM:DD'
+    return year if len(year) == 4 and year.isascii() and year.isdigit() else None
+
+def year_from_mtime(mtime):
+    """
+    Obtiene el año a partir de la fecha de modificación del archivo (st_mtime_ns).
+    """
+    return str(datetime.fromtimestamp(mtime / 1e9).year)
+
+def extract(path, mtime):
+    """
+    Abre la imagen una sola vez y obtiene su año de creación y la miniatura de
+    32x32 en escala de grises sobre la que se calcula su pHash.
+    El año prioriza el metadato EXIF 'DateTimeOriginal' (en JPEG con el analizador
+    propio; si no lo encuentra o en otros formatos, con exifread si está disponible
+    o con PIL); si no existe, usa la fecha de modificación del archivo. La miniatura
+    se obtiene con libvips si está disponible y con PIL en caso contrario; es None
+    si la imagen no se puede leer. PIL solo se abre si hace falta.
+    """
+    year, thumb = None, None
+    if path.lower().endswith(JPEG_EXT):
+        year = jpeg_exif_year(path)
+    if year is None and exifread is not None:
+        try:
+            year = exifread_year(path)
+        except:
+            pass  # Formato sin EXIF o metadatos dañados
+    if pyvips is not None:
+        try:
+            thumb = vips_thumbnail(path)
+        except:
+            pass  # Formato no soportado por libvips: se usa PIL
+    if thumb is None or (year is None and exifread is None):
+        try:
+            with Image.open(path) as img:  # Apertura perezosa: solo lee la cabecera
+                if year is None and exifread is None:
+                    try:
+                        year = year_from_exif(img)
+                    except:
+                        pass  # Formato sin EXIF o metadatos dañados
+                if thumb is None:
+                    thumb = pil_thumbnail(img)
+        except:
+            pass
     # Si no hay metadatos, usar la fecha del sistema de archivos
-    return str(datetime.fromtimestamp(os.path.getmtime(path)).year)
+    return year or year_from_mtime(mtime), thumb
 
-def copy(src, dst):
+def fast_copy(src, dst):
+    """
+    Copia un archivo usando la vía más rápida que admita el sistema de archivos:
+    1. Reflink (FICLONE) en btrfs/XFS: instantáneo y sin ocupar espacio extra.
+    2. os.copy_file_range: el kernel copia los datos sin pasarlos por el proceso.
+    3. Copia convencional por bloques como último recurso.
+    Después copia los metadatos (fecha, permisos) igual que shutil.copy2.
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            size = remaining = os.fstat(fsrc.fileno()).st_size
+            try:
+                while remaining > 0:  # copy_file_range puede copiar menos de lo pedido
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if n == 0:
+                        break
+                    remaining -= n
+            except (AttributeError, OSError):
+                remaining = size  # Sin soporte del kernel: se copia todo de nuevo
+            if remaining == size and size > 0:
+                # copy_file_range no copió nada (sin soporte o devuelve 0 en
+                # este sistema de archivos): volver al inicio y copiar por bloques
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+                shutil.copyfileobj(fsrc, fdst, CHUNK)
+            elif remaining > 0:
+                raise OSError(errno.EIO, "Copia incompleta", dst)
+    shutil.copystat(src, dst)
+
+def copy(src, dst, made):
     """
     Copia un archivo a la ruta destino, creando las carpetas necesarias si no existen.
+    Cada carpeta se crea solo la primera vez que se usa.
+    """
+    d = os.path.dirname(dst)
+    if d not in made:  # 'made': carpetas destino ya creadas en esta ejecución
+        os.makedirs(d, exist_ok=True)
+        made.add(d)
+    try:
+        done, st = os.stat(dst), os.stat(src)
+    except FileNotFoundError:
+        pass
+    else:
+        # Ya copiada en una ejecución anterior: copystat conserva tamaño y fecha
+        if done.st_size == st.st_size and done.st_mtime_ns == st.st_mtime_ns:
+            return
+    fast_copy(src, dst)  # Copia manteniendo metadatos (fecha, permisos)
+
+def iter_images(root):
+    """
+    Recorre recursivamente la carpeta con os.scandir y devuelve (ruta, tamaño, fecha
+    de modificación en ns) de cada imagen. Se hace un único stat por archivo, que
+    además se reutiliza para el prefiltro por tamaño, la fecha de respaldo y la caché.
+    Como os.walk, procesa primero los archivos de cada carpeta y luego sus subcarpetas.
     """
-    os.makedirs(os.path.dirname(dst), exist_ok=True)
-    shutil.copy2(src, dst)  # Copia manteniendo metadatos (fecha, permisos)
+    subdirs = []
+    try:
+        with os.scandir(root) as it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        subdirs.append(e.path)
+                        continue
+                    # Comparar solo la extensión en minúsculas, sin copiar todo el nombre
+                    name = e.name
+                    dot = name.rfind(".")
+                    if dot >= 0 and name[dot:].lower() in EXT_SET and e.is_file():
+                        st = e.stat()
+                        yield e.path, st.st_size, st.st_mtime_ns
+                except OSError as err:
+                    print(f"Error {e.path}: {err}")
+    except OSError as e:
+        print(f"Error {root}: {e}")
+    for d in subdirs:
+        yield from iter_images(d)
+
+def batched(items, n):
+    """
+    Agrupa los elementos en listas de hasta 'n' elementos, conservando el orden.
+    Como iter_images recorre carpeta por carpeta, cada lote agrupa archivos vecinos.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def compute_features(batch):
+    """
+    Calcula las características de un lote de imágenes que no dependen de las demás
+    (año y pHash). Se ejecuta en paralelo en procesos separados.
+    Recibe una lista de (ruta, tamaño, mtime, fila de caché) tal como los produce
+    with_cache; las imágenes con fila en caché no se vuelven a procesar. Las
+    miniaturas del resto se apilan y su pHash se calcula con una sola llamada al
+    kernel DCT.
+    Devuelve una entrada (diccionario) por imagen; 'error' es None si todo fue bien.
+    """
+    results, thumbs, slots = [], [], []
+    for path, size, mtime, cached in batch:
+        entry = {"path": path, "size": size, "mtime": mtime, "year": None,
+                 "phash": None, "quick": None, "full": None, "error": None}
+        if cached:
+            entry["year"], entry["phash"], entry["quick"], entry["full"] = cached
+        else:
+            try:
+                entry["year"], thumb = extract(path, mtime)
+                if thumb is not None:
+                    slots.append(len(results))
+                    thumbs.append(thumb)
+            except Exception as e:
+                entry["error"] = e
+        results.append(entry)
+    if thumbs:
+        for i, h in zip(slots, dct_phash_batch(np.stack(thumbs))):
+            results[i]["phash"] = int(h)
+    return results
+
+def ordered_map(pool, fn, items, depth):
+    """
+    Equivalente a pool.map, pero con como máximo 'depth' tareas enviadas a la vez:
+    la entrada se consume a medida que se recogen los resultados (en orden), de
+    modo que la clasificación empieza sin esperar a recorrer todo el árbol y los
+    resultados no se acumulan en memoria si las copias van más lentas.
+    """
+    window, items = deque(), iter(items)
+    try:
+        for item in islice(items, depth):
+            window.append(pool.submit(fn, item))
+        while window:
+            result = window.popleft().result()
+            for item in islice(items, 1):
+                window.append(pool.submit(fn, item))
+            yield result
+    finally:
+        for f in window:
+            f.cancel()  # Si se interrumpe la clasificación, no seguir calculando
+
+def open_cache(dst):
+    """
+    Abre (o crea) la caché en disco con las características ya calculadas de cada
+    imagen, para que una nueva ejecución no vuelva a procesar archivos sin cambios.
+    """
+    db = sqlite3.connect(os.path.join(dst, CACHE_FILE))
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("CREATE TABLE IF NOT EXISTS cache(path TEXT PRIMARY KEY, mtime INTEGER, "
+               "size INTEGER, year TEXT, phash INTEGER, quick TEXT, digest TEXT, decoder TEXT)")
+    # Mismo esquema en los scripts de Linux y macOS: ambos pueden usar el mismo destino
+    if "decoder" not in {col[1] for col in db.execute("PRAGMA table_info(cache)")}:
+        # Caché de una versión anterior: sus filas no coinciden con ningún decodificador
+        db.execute("ALTER TABLE cache ADD COLUMN decoder TEXT")
+    return db
+
+def with_cache(items, db):
+    """
+    Añade a cada (ruta, tamaño, mtime) de iter_images la fila de la caché
+    (año, pHash, hash rápido, hash completo) si el archivo no cambió desde que se
+    guardó (misma ruta absoluta, st_mtime_ns y tamaño) con el mismo decodificador,
+    o None si hay que procesarlo (también si 'db' es None).
+    """
+    for path, size, mtime in items:
+        row = None
+        if db is not None:
+            try:
+                row = db.execute("SELECT year, phash, quick, digest FROM cache "
+                                 "WHERE path = ? AND mtime = ? AND size = ? AND decoder = ?",
+                                 (os.path.abspath(path), mtime, size, DECODER)).fetchone()
+            except sqlite3.Error:
+                pass  # Caché inutilizable (ya se avisó al abrirla o al escribir): se recalcula
+        if row and row[1] is not None:
+            row = (row[0], row[1] % (1 << 64), row[2], row[3])  # pHash de vuelta a uint64
+        yield path, size, mtime, row
+
+def cache_store(db, entry):
+    """
+    Guarda en la caché las características de una imagen. SQLite solo admite
+    enteros con signo de 64 bits, así que el pHash se guarda con el mismo patrón de bits.
+    """
+    p = entry["phash"]
+    if p is not None and p >= 1 << 63:
+        p -= 1 << 64
+    db.execute("INSERT OR REPLACE INTO cache(path, mtime, size, year, phash, quick, digest, decoder) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+               (os.path.abspath(entry["path"]), entry["mtime"], entry["size"],
+                entry["year"], p, entry["quick"], entry["full"], DECODER))
+
+def copy_worker(tasks, made):
+    """
+    Hilo copiador: toma tareas (origen, destino, future) de la cola y las copia
+    hasta recibir el centinela None. Cada future se marca como terminado o fallido
+    para que el proceso principal pueda registrar el resultado en el log.
+    'made' es el conjunto de carpetas ya creadas, compartido entre los copiadores.
+    """
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        src, dst, future = task
+        try:
+            copy(src, dst, made)
+            future.set_result(None)
+        except Exception as e:
+            future.set_exception(e)
+
+def flush_copies(copies, pending, log_f, wait_all=False):
+    """
+    Escribe en el log, en el orden de clasificación, las copias que ya terminaron,
+    y las retira de la cola de copias en curso. Con wait_all=True espera a que
+    terminen todas. Las copias fallidas se informan y no se registran.
+    """
+    while copies and (wait_all or copies[0][1].done()):
+        full, future, target, line = copies.popleft()
+        if pending.get(target) is future:
+            del pending[target]
+        if future.exception() is not None:
+            print(f"Error {full}: {future.exception()}")
+        else:
+            log_f.write(line + "\n")
 
 def organize(src, dst):
     """
@@ -73,42 +674,110 @@ def organize(src, dst):
     - Imágenes únicas: /Fotos/AÑO/
     - Duplicadas o similares: /Posibles_Duplicados/AÑO/
     Además, genera un log con el detalle del proceso.
+    Las características de cada imagen se calculan en paralelo y las copias se
+    realizan en segundo plano; la clasificación se hace en orden en el proceso
+    principal para que el resultado sea determinista. Las características quedan
+    guardadas en una caché SQLite en la carpeta destino para no recalcularlas en
+    la siguiente ejecución.
     """
-    unique, similar = {}, {}  # Diccionario para almacenar hashes únicos y sus pHash
-    log = []  # Lista para registrar el proceso
+    sizes, hashes = {}, PHashIndex()  # Imágenes únicas agrupadas por tamaño y sus pHash
+    copies, pending = deque(), {}  # Copias en curso y última copia pendiente por destino
 
-    # Recorrer recursivamente todas las subcarpetas
-    for root, _, files in os.walk(src):
-        for file in files:
-            if file.lower().endswith(EXT):  # Filtra solo imágenes
-                full = os.path.join(root, file)
-                try:
-                    year = get_year(full)
-                    md5 = md5_hash(full)
-                    p = phash(full)
+    # Recorrer recursivamente todas las subcarpetas, filtrando solo imágenes
+    items = iter_images(src)
 
+    # El log se escribe a medida que terminan las copias, sin acumularlo en memoria
+    os.makedirs(dst, exist_ok=True)
+    # La caché es opcional: si falla (bloqueada por otra ejecución, disco lleno...)
+    # se avisa y se sigue organizando sin ella
+    try:
+        db = open_cache(dst)
+    except sqlite3.Error as e:
+        print(f"Caché no disponible: {e}")
+        db = None
+    writes = 0
+
+    def store(entry, commit=False):
+        """
+        Guarda una entrada en la caché (o solo confirma si 'commit'), confirmando
+        cada CACHE_COMMIT escrituras. Un error desactiva la caché sin detener la copia.
+        """
+        nonlocal db, writes
+        if db is None:
+            return
+        try:
+            if entry is not None:
+                cache_store(db, entry)
+                writes += 1
+            if commit or writes % CACHE_COMMIT == 0:
+                db.commit()
+        except sqlite3.Error as e:
+            print(f"Caché desactivada: {e}")
+            db.close()
+            db = None
+
+    # Hilos copiadores alimentados por una cola acotada: la copia se solapa con
+    # la clasificación sin acumular tareas pendientes sin límite
+    # Las carpetas creadas se recuerdan solo durante esta ejecución (evita repetir
+    # os.makedirs en cada copia sin fallar si el destino cambia entre llamadas)
+    tasks, made = queue.Queue(maxsize=COPY_QUEUE), set()
+    copiers = [threading.Thread(target=copy_worker, args=(tasks, made), daemon=True)
+               for _ in range(COPY_WORKERS)]
+    for c in copiers:
+        c.start()
+
+    try:
+        with open(os.path.join(dst, "log_organizacion.txt"), "w", buffering=LOG_BUFFER) as log_f, \
+             ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                 mp_context=multiprocessing.get_context(POOL_START)) as pool:
+            batches = batched(with_cache(items, db), PHASH_BATCH)
+            features = chain.from_iterable(ordered_map(pool, compute_features, batches, POOL_WINDOW))
+            for entry in features:
+                full, year, p = entry["path"], entry["year"], entry["phash"]
+                if entry["error"] is not None:
+                    print(f"Error {full}: {entry['error']}")
+                    continue
+                try:
                     # Determinar destino según duplicados exactos o similares
-                    if md5 in unique:
+                    if is_exact_duplicate(entry, sizes, store):
                         # Imagen duplicada exacta
                         folder = os.path.join(dst, "Posibles_Duplicados", year)
-                    elif any(abs(int(p,16) - int(h,16)) < 10 for h in unique.values() if h):
-                        # Imagen similar (comparación de pHash con tolerancia <10)
+                    elif p is not None and hashes.has_similar(p, TOLERANCE):
+                        # Imagen similar (distancia de Hamming entre pHash menor que la tolerancia)
                         folder = os.path.join(dst, "Posibles_Duplicados", year)
                     else:
                         # Imagen única
                         folder = os.path.join(dst, "Fotos", year)
-                        unique[md5] = p  # Guardar hash para futuras comparaciones
+                        sizes.setdefault(entry["size"], []).append(entry)
+                        if p is not None:
+                            hashes.add(p)  # Guardar pHash para futuras comparaciones
+
+                    store(entry)  # Se guarda en cuanto se clasifica
 
-                    # Copiar archivo a la carpeta correspondiente
-                    copy(full, os.path.join(folder, file))
-                    log.append(f"{full} => {folder}/{file}")
+                    # Copiar archivo a la carpeta correspondiente; si ya hay una copia
+                    # pendiente hacia el mismo destino, esperar a que termine
+                    file = os.path.basename(full)
+                    target = os.path.join(folder, file)
+                    if target in pending:
+                        wait([pending[target]])
+                    pending[target] = Future()
+                    tasks.put((full, target, pending[target]))  # Espera si la cola está llena
+                    copies.append((full, pending[target], target, f"{full} => {folder}/{file}"))
+                    flush_copies(copies, pending, log_f)
 
                 except Exception as e:
                     print(f"Error {full}: {e}")
 
-    # Guardar log del proceso
-    with open(os.path.join(dst, "log_organizacion.txt"), "w") as f:
-        f.write("\n".join(log))
+            # Registrar las copias que aún estén en curso
+            flush_copies(copies, pending, log_f, wait_all=True)
+    finally:
+        store(None, commit=True)  # Lo ya clasificado se conserva aunque se interrumpa la ejecución
+        if db is not None:
+            db.close()
+        for _ in copiers:
+            tasks.put(None)  # Centinela: indica a cada copiador que no hay más tareas
+        for c in copiers:
+            c.join()
 
 if __name__ == "__main__":
     # Ejecución interactiva del script
@@ -5,7 +5,7 @@ Script: Organizador de Fotos (macOS)
 Autor: Sheila Gomez
 Descripción:
     Este script organiza imágenes copiándolas a nuevas carpetas clasificadas por año 
-    y separando las fotos únicas de las posibles duplicadas (basado en hash MD5).
+    y separando las fotos únicas de las posibles duplicadas (basado en hash SHA-256).
     - Las imágenes únicas se almacenan en /Fotos/AÑO/
     - Las duplicadas se almacenan en /Posibles_Duplicados/AÑO/
     - Se genera un log con el detalle del proceso (rutas originales y destino).
@@ -14,24 +14,189 @@ Compatibilidad:
     macOS con Python 3.7+ y librerías Pillow, imagehash.
 """
 
-import os, hashlib, shutil, imagehash
-from PIL import Image, ExifTags
+import os, ctypes, ctypes.util, hashlib, shutil, imagehash
+import logging, mmap, multiprocessing, queue, sqlite3, struct, threading
+from collections import deque
+from itertools import chain, islice
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from PIL import Image
 from datetime import datetime
 
+try:
+    import exifread  # Opcional: lee solo la cabecera EXIF, sin abrir la imagen con PIL
+    logging.getLogger("exifread").setLevel(logging.ERROR)  # Silenciar avisos por archivo
+except ImportError:
+    exifread = None  # Sin exifread se leen los metadatos con PIL
+
+# clonefile(2) de libc: clona archivos en APFS de forma instantánea (copy-on-write)
+try:
+    _clonefile = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True).clonefile
+    _clonefile.argtypes = (ctypes.c_char_p, ctypes.c_char_p, ctypes.c_uint32)
+    _clonefile.restype = ctypes.c_int
+except (OSError, AttributeError):
+    _clonefile = None  # Sistema sin clonefile (macOS < 10.12)
+
 # Extensiones de imagen soportadas
 EXT = (".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".gif", ".heic")
+EXT_SET = frozenset(EXT)  # Búsqueda O(1) de la extensión
+
+# Identificador del tag EXIF 'DateTimeOriginal' (formato 'YYYY:MM:DD HH:MM:SS')
+DATETIME_ORIGINAL = 36867
+
+# Extensiones JPEG, cuyo EXIF se lee con el analizador propio
+JPEG_EXT = (".jpg", ".jpeg")
+
+# Bytes iniciales de un JPEG donde se busca el segmento EXIF (como máximo ocupa 64 KiB)
+EXIF_SCAN = 128 * 1024
+
+# Tamaño de bloque para lectura de archivos (1 MiB)
+CHUNK = 1 << 20
+
+# Bytes leídos al inicio y al final de cada archivo para el hash rápido (64 KiB)
+QUICK = 64 * 1024
+
+# Tamaño mínimo para hashear un archivo proyectándolo en memoria con mmap (64 KiB)
+MMAP_MIN = 64 * 1024
+
+# Archivos a partir de este tamaño se hashean con lecturas concurrentes (8 MiB)
+PREAD_MIN = 8 << 20
+
+# Lecturas de 1 MiB en curso por archivo y hilos lectores que las atienden
+READ_DEPTH = 32
+READ_WORKERS = 16
+_readers = None
+
+# Hilos dedicados a copiar archivos (la copia libera el GIL durante la E/S)
+COPY_WORKERS = 4
+
+# Método de inicio de los procesos que calculan características: los hilos
+# copiadores ya están en marcha y con fork un proceso con hilos puede bloquearse
+POOL_START = "spawn"
+
+# Copias pendientes como máximo entre la clasificación y los hilos copiadores
+COPY_QUEUE = 64
+
+# Caché de características en la carpeta destino y filas entre cada commit
+CACHE_FILE = ".organizer_cache.sqlite"
+CACHE_COMMIT = 1000
+
+# Tamaño del búfer del archivo de log (1 MiB)
+LOG_BUFFER = 1 << 20
+
+# Imágenes por lote enviado a cada proceso (reduce la comunicación entre procesos)
+FEATURE_BATCH = 32
+
+# Lotes enviados como máximo a la vez a los procesos de características
+POOL_WINDOW = 2 * (os.cpu_count() or 1)
+
+def _read_pool():
+    """
+    Devuelve el grupo de hilos lectores usado por pread_hash (se crea al primer uso).
+    """
+    global _readers
+    if _readers is None:
+        _readers = ThreadPoolExecutor(max_workers=READ_WORKERS)
+    return _readers
+
+def pread_hash(fd, size):
+    """
+    Calcula el SHA-256 de un archivo grande manteniendo hasta READ_DEPTH lecturas
+    de 1 MiB en curso a la vez (os.pread en hilos), de modo que el disco recibe
+    varias peticiones simultáneas mientras los bloques ya leídos se hashean en orden.
+    """
+    pool, h, window = _read_pool(), hashlib.sha256(), deque()
+    offsets = iter(range(0, size, CHUNK))
+    for off in islice(offsets, READ_DEPTH):
+        window.append(pool.submit(os.pread, fd, CHUNK, off))
+    try:
+        while window:
+            h.update(window.popleft().result())
+            off = next(offsets, None)
+            if off is not None:
+                window.append(pool.submit(os.pread, fd, CHUNK, off))
+    finally:
+        # Si una lectura falla, ninguna otra puede seguir usando el descriptor
+        # después de que quien llama lo cierre
+        for f in window:
+            f.cancel()
+        wait(window)
+    return h.hexdigest()
 
-def md5_hash(path):
+def file_hash(path):
     """
-    Calcula el hash MD5 de un archivo.
+    Calcula el hash SHA-256 de un archivo.
     Permite identificar duplicados exactos comparando su contenido binario.
+    Los archivos pequeños se leen directamente; los medianos se proyectan en memoria
+    con mmap y se hashean de una sola vez, sin copias intermedias; los muy grandes
+    se leen con varias lecturas concurrentes (pread_hash). Si mmap no es posible,
+    usa hashlib.file_digest (Python 3.11+) o lee bloques de 1 MiB.
     """
-    h = hashlib.md5()
-    with open(path, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b""):  # Lectura por bloques para mayor eficiencia
+    with open(path, 'rb', buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_MIN:
+            return hashlib.sha256(f.read()).hexdigest()
+        if size >= PREAD_MIN:
+            return pread_hash(f.fileno(), size)
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return hashlib.sha256(mm).hexdigest()
+        except (OSError, ValueError):
+            pass  # Archivo que no se puede proyectar en memoria: leer por bloques
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
+        for chunk in iter(lambda: f.read(CHUNK), b""):  # Lectura por bloques grandes
             h.update(chunk)
     return h.hexdigest()
 
+def quick_hash(path, size):
+    """
+    Calcula un hash rápido leyendo solo los primeros y últimos 64 KiB del archivo.
+    Se usa como prefiltro: si no coincide, los archivos no pueden ser idénticos
+    y se evita leerlos completos.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        h = hashlib.sha256(os.pread(fd, QUICK, 0))
+        if size > QUICK:
+            h.update(os.pread(fd, QUICK, max(QUICK, size - QUICK)))
+    finally:
+        os.close(fd)
+    return h.hexdigest()
+
+def same_content(entry, other):
+    """
+    Compara dos imágenes del mismo tamaño: primero por el hash rápido y, si
+    coincide, por el hash completo. Los hashes calculados quedan guardados en cada entrada.
+    """
+    for e in (entry, other):
+        if e["quick"] is None:
+            e["quick"] = quick_hash(e["path"], e["size"])
+    if entry["quick"] != other["quick"]:
+        return False
+    if entry["size"] <= 2 * QUICK:
+        return True  # El hash rápido ya cubrió el archivo completo
+    for e in (entry, other):
+        if e["full"] is None:
+            e["full"] = file_hash(e["path"])
+    return entry["full"] == other["full"]
+
+def is_exact_duplicate(entry, sizes, store):
+    """
+    Indica si la imagen de 'entry' es idéntica a alguna imagen única ya registrada.
+    'sizes' agrupa las imágenes únicas por tamaño; solo se calculan hashes si hay
+    otra imagen del mismo tamaño. Si se calcula un hash de una imagen ya
+    registrada, se vuelve a guardar con 'store' para no perderlo en la caché.
+    """
+    for other in sizes.get(entry["size"], ()):
+        known = other["quick"], other["full"]
+        same = same_content(entry, other)
+        if (other["quick"], other["full"]) != known:
+            store(other)
+        if same:
+            return True
+    return False
+
 def phash(path):
     """
     Calcula el perceptual hash (pHash) de una imagen.
@@ -43,64 +208,395 @@ def phash(path):
     except:
         return None
 
-def get_year(path):
+def _ifd_find(tiff, order, offset, tag):
+    """
+    Busca un tag en el IFD que empieza en 'offset' dentro del bloque TIFF del EXIF.
+    Devuelve (tipo, cantidad, campo de valor de 4 bytes) o None si no está.
+    """
+    count = struct.unpack_from(order + "H", tiff, offset)[0]
+    for i in range(count):
+        entry = offset + 2 + 12 * i  # Cada entrada ocupa 12 bytes
+        t, typ, n = struct.unpack_from(order + "HHI", tiff, entry)
+        if t == tag:
+            return typ, n, tiff[entry + 8:entry + 12]
+    return None
+
+def jpeg_exif_year(path):
+    """
+    Obtiene el año de 'DateTimeOriginal' de un JPEG analizando directamente su
+    segmento EXIF (APP1), sin librerías de imagen: recorre los segmentos del
+    encabezado, busca en IFD0 el puntero al IFD EXIF (tag 0x8769) y en este el
+    tag 0x9003, del que lee solo los 4 bytes del año.
+    Devuelve None si el archivo no tiene ese metadato o su estructura es inesperada.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(EXIF_SCAN)
+        if data[:2] != b"\xff\xd8":
+            return None  # No es un JPEG
+        pos = 2
+        while pos + 4 <= len(data) and data[pos] == 0xFF:
+            marker = data[pos + 1]
+            if marker in (0xDA, 0xD9):
+                return None  # Inicio de los datos de imagen: no hay EXIF
+            length = int.from_bytes(data[pos + 2:pos + 4], "big")
+            if marker == 0xE1 and data[pos + 4:pos + 10] == b"Exif\x00\x00":
+                tiff = data[pos + 10:pos + 2 + length]
+                order = {b"II": "<", b"MM": ">"}[tiff[:2]]
+                ifd0 = struct.unpack_from(order + "I", tiff, 4)[0]
+                ptr = _ifd_find(tiff, order, ifd0, 0x8769)
+                if ptr is None:
+                    return None
+                dto = _ifd_find(tiff, order, struct.unpack(order + "I", ptr[2])[0], 0x9003)
+                if dto is None or dto[0] != 2 or dto[1] < 5:  # Debe ser texto ASCII
+                    return None
+                at = struct.unpack(order + "I", dto[2])[0]
+                year = tiff[at:at + 4]
+                return year.decode("ascii") if len(year) == 4 and year.isdigit() else None
+            pos += 2 + length
+    except (OSError, KeyError, struct.error):
+        pass
+    return None
+
+def exifread_year(path):
+    """
+    Obtiene el año del metadato EXIF 'DateTimeOriginal' usando exifread, que lee
+    solo la cabecera EXIF y se detiene al encontrar ese tag.
+    Devuelve None si la imagen no tiene ese metadato o no contiene un año válido.
+    """
+    with open(path, 'rb') as f:
+        tags = exifread.process_file(f, stop_tag='DateTimeOriginal', details=False)
+    val = tags.get('EXIF DateTimeOriginal')
+    year = str(val)[:4] if val else ""  # Extrae el año del formato 'YYYY:MM:DD'
+    # Una fecha en blanco o no ASCII (p. ej. "[49, 57, ...]") no es un año válido
+    return year if len(year) == 4 and year.isascii() and year.isdigit() else None
+
+def get_year(path, mtime):
     """
     Obtiene el año de creación de una imagen.
-    Prioriza el metadato EXIF 'DateTimeOriginal'.
+    Prioriza el metadato EXIF 'DateTimeOriginal': en JPEG se lee con el analizador
+    propio; si no lo encuentra o en otros formatos, con exifread si está disponible
+    (sin abrir la imagen) o con PIL en caso contrario.
     Si no existe, usa la fecha de modificación del archivo en el sistema.
     """
+    if path.lower().endswith(JPEG_EXT):
+        year = jpeg_exif_year(path)
+        if year:
+            return year
     try:
-        with Image.open(path) as img:
-            exif = img._getexif()
-            if exif:
-                for tag, val in exif.items():
-                    if ExifTags.TAGS.get(tag) == 'DateTimeOriginal':
-                        return val.split(":")[0]  # Extrae solo el año del formato 'YYYY:MM:DD'
+        if exifread is not None:
+            year = exifread_year(path)
+            if year:
+                return year
+        else:
+            with Image.open(path) as img:
+                exif = img._getexif()
+                val = exif.get(DATETIME_ORIGINAL) if exif else None
+                # PIL devuelve bytes si el tag no es ASCII: solo se acepta un año de 4 cifras
+                year = val[:4] if isinstance(val, str) else ""  # Año del formato 'YYYY:MM:DD'
+                if len(year) == 4 and year.isascii() and year.isdigit():
+                    return year
     except:
         pass
-    # Si no hay EXIF, devolver año de modificación
-    return str(datetime.fromtimestamp(os.path.getmtime(path)).year)
+    # Si no hay EXIF, devolver año de modificación (st_mtime_ns)
+    return str(datetime.fromtimestamp(mtime / 1e9).year)
 
-def copy(src, dst):
+def fast_copy(src, dst):
     """
-    Copia un archivo desde el origen al destino, 
-    creando la carpeta si no existe y manteniendo metadatos (fecha, permisos).
+    Copia un archivo clonándolo con clonefile(2) cuando es posible: en APFS la copia
+    es instantánea y no ocupa espacio extra hasta que alguno de los dos se modifique.
+    Si no se puede clonar (otro sistema de archivos, destino ya existente, etc.),
+    usa shutil.copy2.
     """
-    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if _clonefile is not None and _clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0:
+        shutil.copystat(src, dst)
+        return
     shutil.copy2(src, dst)
 
+def copy(src, dst, made):
+    """
+    Copia un archivo desde el origen al destino, 
+    creando la carpeta si no existe (solo la primera vez) y manteniendo metadatos (fecha, permisos).
+    """
+    d = os.path.dirname(dst)
+    if d not in made:  # 'made': carpetas destino ya creadas en esta ejecución
+        os.makedirs(d, exist_ok=True)
+        made.add(d)
+    try:
+        done, st = os.stat(dst), os.stat(src)
+    except FileNotFoundError:
+        pass
+    else:
+        # Ya copiada en una ejecución anterior: copystat conserva tamaño y fecha
+        if done.st_size == st.st_size and done.st_mtime_ns == st.st_mtime_ns:
+            return
+    fast_copy(src, dst)
+
+def iter_images(root):
+    """
+    Recorre recursivamente la carpeta con os.scandir y devuelve (ruta, tamaño, fecha
+    de modificación en ns) de cada imagen. Se hace un único stat por archivo, que
+    además se reutiliza para el prefiltro por tamaño, la fecha de respaldo y la caché.
+    Como os.walk, procesa primero los archivos de cada carpeta y luego sus subcarpetas.
+    """
+    subdirs = []
+    try:
+        with os.scandir(root) as it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        subdirs.append(e.path)
+                        continue
+                    # Comparar solo la extensión en minúsculas, sin copiar todo el nombre
+                    name = e.name
+                    dot = name.rfind(".")
+                    if dot >= 0 and name[dot:].lower() in EXT_SET and e.is_file():
+                        st = e.stat()
+                        yield e.path, st.st_size, st.st_mtime_ns
+                except OSError as err:
+                    print(f"Error {e.path}: {err}")
+    except OSError as e:
+        print(f"Error {root}: {e}")
+    for d in subdirs:
+        yield from iter_images(d)
+
+def compute_features(item):
+    """
+    Calcula las características de una imagen que no dependen de las demás
+    (su año). Se ejecuta en paralelo en procesos separados.
+    Recibe (ruta, tamaño, mtime, fila de caché) tal como los produce with_cache;
+    si la imagen tiene fila en caché no se vuelve a procesar.
+    Devuelve una entrada (diccionario) con sus datos; 'error' es None si todo fue bien.
+    """
+    path, size, mtime, cached = item
+    entry = {"path": path, "size": size, "mtime": mtime, "year": None,
+             "phash": None, "quick": None, "full": None, "error": None}
+    if cached:
+        entry["year"], _, entry["quick"], entry["full"] = cached
+        return entry
+    try:
+        entry["year"] = get_year(path, mtime)
+    except Exception as e:
+        entry["error"] = e
+    return entry
+
+def compute_batch(batch):
+    """
+    Calcula las características de un lote de imágenes en un mismo proceso.
+    """
+    return [compute_features(item) for item in batch]
+
+def batched(items, n):
+    """
+    Agrupa los elementos en listas de hasta 'n' elementos, conservando el orden.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def ordered_map(pool, fn, items, depth):
+    """
+    Equivalente a pool.map, pero con como máximo 'depth' tareas enviadas a la vez:
+    la entrada se consume a medida que se recogen los resultados (en orden), de
+    modo que la clasificación empieza sin esperar a recorrer todo el árbol y los
+    resultados no se acumulan en memoria si las copias van más lentas.
+    """
+    window, items = deque(), iter(items)
+    try:
+        for item in islice(items, depth):
+            window.append(pool.submit(fn, item))
+        while window:
+            result = window.popleft().result()
+            for item in islice(items, 1):
+                window.append(pool.submit(fn, item))
+            yield result
+    finally:
+        for f in window:
+            f.cancel()  # Si se interrumpe la clasificación, no seguir calculando
+
+def open_cache(dst):
+    """
+    Abre (o crea) la caché en disco con las características ya calculadas de cada
+    imagen, para que una nueva ejecución no vuelva a procesar archivos sin cambios.
+    """
+    db = sqlite3.connect(os.path.join(dst, CACHE_FILE))
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("CREATE TABLE IF NOT EXISTS cache(path TEXT PRIMARY KEY, mtime INTEGER, "
+               "size INTEGER, year TEXT, phash INTEGER, quick TEXT, digest TEXT, decoder TEXT)")
+    # Mismo esquema en los scripts de Linux y macOS: ambos pueden usar el mismo destino
+    if "decoder" not in {col[1] for col in db.execute("PRAGMA table_info(cache)")}:
+        # Caché de una versión anterior: sus filas no coinciden con ningún decodificador
+        db.execute("ALTER TABLE cache ADD COLUMN decoder TEXT")
+    return db
+
+def with_cache(items, db):
+    """
+    Añade a cada (ruta, tamaño, mtime) de iter_images la fila de la caché
+    (año, pHash, hash rápido, hash completo) si el archivo no cambió desde que se
+    guardó (misma ruta absoluta, st_mtime_ns y tamaño), o None si hay que procesarlo
+    (también si 'db' es None).
+    """
+    for path, size, mtime in items:
+        row = None
+        if db is not None:
+            try:
+                row = db.execute("SELECT year, phash, quick, digest FROM cache "
+                                 "WHERE path = ? AND mtime = ? AND size = ?",
+                                 (os.path.abspath(path), mtime, size)).fetchone()
+            except sqlite3.Error:
+                pass  # Caché inutilizable (ya se avisó al abrirla o al escribir): se recalcula
+        if row and row[1] is not None:
+            row = (row[0], row[1] % (1 << 64), row[2], row[3])  # pHash de vuelta a uint64
+        yield path, size, mtime, row
+
+def cache_store(db, entry):
+    """
+    Guarda en la caché las características de una imagen. SQLite solo admite
+    enteros con signo de 64 bits, así que el pHash se guarda con el mismo patrón de bits.
+    """
+    p = entry["phash"]
+    if p is not None and p >= 1 << 63:
+        p -= 1 << 64
+    db.execute("INSERT OR REPLACE INTO cache(path, mtime, size, year, phash, quick, digest, decoder) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+               (os.path.abspath(entry["path"]), entry["mtime"], entry["size"],
+                entry["year"], p, entry["quick"], entry["full"], None))  # Sin pHash: sin decodificador
+
+def copy_worker(tasks, made):
+    """
+    Hilo copiador: toma tareas (origen, destino, future) de la cola y las copia
+    hasta recibir el centinela None. Cada future se marca como terminado o fallido
+    para que el proceso principal pueda registrar el resultado en el log.
+    'made' es el conjunto de carpetas ya creadas, compartido entre los copiadores.
+    """
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        src, dst, future = task
+        try:
+            copy(src, dst, made)
+            future.set_result(None)
+        except Exception as e:
+            future.set_exception(e)
+
+def flush_copies(copies, pending, log_f, wait_all=False):
+    """
+    Escribe en el log, en el orden de clasificación, las copias que ya terminaron,
+    y las retira de la cola de copias en curso. Con wait_all=True espera a que
+    terminen todas. Las copias fallidas se informan y no se registran.
+    """
+    while copies and (wait_all or copies[0][1].done()):
+        full, future, target, line = copies.popleft()
+        if pending.get(target) is future:
+            del pending[target]
+        if future.exception() is not None:
+            print(f"Error {full}: {future.exception()}")
+        else:
+            log_f.write(line + "\n")
+
 def organize(src, dst):
     """
     Recorre todas las imágenes en la carpeta origen y las organiza en:
-    - /Fotos/AÑO/ si son únicas (según MD5)
+    - /Fotos/AÑO/ si son únicas (según SHA-256)
     - /Posibles_Duplicados/AÑO/ si ya existe un duplicado exacto
     Además, genera un archivo log con el detalle de las acciones.
+    El año de cada imagen se obtiene en paralelo y las copias se realizan en
+    segundo plano; la clasificación se hace en orden en el proceso principal.
+    Los datos calculados se guardan en una caché SQLite en la carpeta destino
+    para no recalcularlos en la siguiente ejecución.
     """
-    unique, log = {}, []  # Diccionario de hashes únicos y lista de acciones realizadas
+    sizes = {}  # Imágenes únicas agrupadas por tamaño
+    copies, pending = deque(), {}  # Copias en curso y última copia pendiente por destino
+
+    items = iter_images(src)  # Recorrido recursivo filtrando solo imágenes
 
-    for root, _, files in os.walk(src):
-        for file in files:
-            if file.lower().endswith(EXT):  # Filtrar solo imágenes
-                full = os.path.join(root, file)
+    # El log se escribe a medida que terminan las copias, sin acumularlo en memoria
+    os.makedirs(dst, exist_ok=True)
+    # La caché es opcional: si falla (bloqueada por otra ejecución, disco lleno...)
+    # se avisa y se sigue organizando sin ella
+    try:
+        db = open_cache(dst)
+    except sqlite3.Error as e:
+        print(f"Caché no disponible: {e}")
+        db = None
+    writes = 0
+
+    def store(entry, commit=False):
+        """
+        Guarda una entrada en la caché (o solo confirma si 'commit'), confirmando
+        cada CACHE_COMMIT escrituras. Un error desactiva la caché sin detener la copia.
+        """
+        nonlocal db, writes
+        if db is None:
+            return
+        try:
+            if entry is not None:
+                cache_store(db, entry)
+                writes += 1
+            if commit or writes % CACHE_COMMIT == 0:
+                db.commit()
+        except sqlite3.Error as e:
+            print(f"Caché desactivada: {e}")
+            db.close()
+            db = None
+
+    # Hilos copiadores alimentados por una cola acotada: la copia se solapa con
+    # la clasificación sin acumular tareas pendientes sin límite
+    # Las carpetas creadas se recuerdan solo durante esta ejecución (evita repetir
+    # os.makedirs en cada copia sin fallar si el destino cambia entre llamadas)
+    tasks, made = queue.Queue(maxsize=COPY_QUEUE), set()
+    copiers = [threading.Thread(target=copy_worker, args=(tasks, made), daemon=True)
+               for _ in range(COPY_WORKERS)]
+    for c in copiers:
+        c.start()
+
+    try:
+        with open(os.path.join(dst, "log_organizacion.txt"), "w", buffering=LOG_BUFFER) as log_f, \
+             ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                 mp_context=multiprocessing.get_context(POOL_START)) as pool:
+            batches = batched(with_cache(items, db), FEATURE_BATCH)
+            features = chain.from_iterable(ordered_map(pool, compute_batch, batches, POOL_WINDOW))
+            for entry in features:
+                full, year = entry["path"], entry["year"]
+                if entry["error"] is not None:
+                    print(f"Error {full}: {entry['error']}")
+                    continue
                 try:
-                    year = get_year(full)      # Obtener año
-                    md5 = md5_hash(full)       # Calcular hash MD5
-                    if md5 in unique:
+                    if is_exact_duplicate(entry, sizes, store):
                         # Imagen duplicada exacta
                         folder = os.path.join(dst, "Posibles_Duplicados", year)
                     else:
                         # Imagen única
                         folder = os.path.join(dst, "Fotos", year)
-                        unique[md5] = True
-                    # Copiar la imagen a la carpeta correspondiente
-                    copy(full, os.path.join(folder, file))
-                    log.append(f"{full} => {folder}/{file}")
+                        sizes.setdefault(entry["size"], []).append(entry)
+                    store(entry)  # Se guarda en cuanto se clasifica
+                    # Copiar la imagen en segundo plano (esperando si hay otra copia al mismo destino)
+                    file = os.path.basename(full)
+                    target = os.path.join(folder, file)
+                    if target in pending:
+                        wait([pending[target]])
+                    pending[target] = Future()
+                    tasks.put((full, target, pending[target]))  # Espera si la cola está llena
+                    copies.append((full, pending[target], target, f"{full} => {folder}/{file}"))
+                    flush_copies(copies, pending, log_f)
                 except Exception as e:
                     print(f"Error {full}: {e}")
-
-    # Guardar log del proceso
-    with open(os.path.join(dst, "log_organizacion.txt"), "w") as f:
-        f.write("\n".join(log))
+            # Registrar las copias que aún estén en curso
+            flush_copies(copies, pending, log_f, wait_all=True)
+    finally:
+        store(None, commit=True)  # Lo ya clasificado se conserva aunque se interrumpa la ejecución
+        if db is not None:
+            db.close()
+        for _ in copiers:
+            tasks.put(None)  # Centinela: indica a cada copiador que no hay más tareas
+        for c in copiers:
+            c.join()
 
 if __name__ == "__main__":
     # Entrada de usuario y ejecución principal